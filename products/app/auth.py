@@ -3,10 +3,12 @@ import jwt
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from app.logger import logger
+from app.tracing import traced
 
 # This ensures the "Authorize" button appears in Swagger
 security = HTTPBearer()
 
+@traced("auth.verify_admin")
 def verify_admin(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token = credentials.credentials
     secret = os.getenv("JWT_SECRET")
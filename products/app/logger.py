@@ -1,6 +1,16 @@
 import structlog
 import logging
 import sys
+from app.tracing import trace_span
+
+
+class TracedBoundLogger(structlog.BoundLogger):
+    """Mede cada chamada de log (processadores + escrita) como span "log"."""
+
+    def _proxy_to_logger(self, method_name, event=None, **event_kw):
+        with trace_span("log"):
+            return super()._proxy_to_logger(method_name, event, **event_kw)
+
 
 def configure_logger():
     structlog.configure(
@@ -19,6 +29,7 @@ def configure_logger():
                 pad_event=20  # Alinha as mensagens
             )
         ],
+        wrapper_class=TracedBoundLogger,
         logger_factory=structlog.PrintLoggerFactory(),
         cache_logger_on_first_use=True,
     )
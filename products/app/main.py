@@ -3,6 +3,7 @@ from dotenv import load_dotenv
 from app.routes import router
 from app.database import connect_to_mongo, close_mongo_connection
 from app.logger import configure_logger, logger
+from app.tracing import tracing_middleware, exporter
 import os
 
 load_dotenv()
@@ -30,6 +31,10 @@ async def startup_sequence():
 # Registar Eventos
 app.add_event_handler("startup", startup_sequence)
 app.add_event_handler("shutdown", close_mongo_connection)
+app.add_event_handler("shutdown", exporter.shutdown)
+
+# Tracing por pedido (request id, spans e header Server-Timing)
+app.middleware("http")(tracing_middleware)
 
 # Registar Rotas
 app.include_router(router)
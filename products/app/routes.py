@@ -11,6 +11,7 @@ from app.models import (
 )
 from app.logger import logger
 from app.auth import verify_admin
+from app.tracing import trace_span
 
 router = APIRouter()
 
@@ -61,7 +62,8 @@ async def list_products(
 
     logger.info("msg", text="Product listing requested", filter=query)
     
-    products = await db.db.products.find(query).to_list(1000)
+    with trace_span("mongo.products.find"):
+        products = await db.db.products.find(query).to_list(1000)
     return products
 
 
@@ -89,7 +91,8 @@ async def create_product(
     logger.info("msg", text="Product creation attempt", admin_id=admin_id)
 
     # Validation: Check if product name already exists
-    existing_product = await db.db.products.find_one({"name": product.name})
+    with trace_span("mongo.products.find_one"):
+        existing_product = await db.db.products.find_one({"name": product.name})
     if existing_product:
         logger.warn("msg", text="Creation failed: Duplicate name", name=product.name)
         raise HTTPException(
@@ -101,8 +104,10 @@ async def create_product(
     new_product["created_at"] = datetime.utcnow()
     new_product["updated_at"] = datetime.utcnow()
     
-    result = await db.db.products.insert_one(new_product)
-    created_product = await db.db.products.find_one({"_id": result.inserted_id})
+    with trace_span("mongo.products.insert_one"):
+        result = await db.db.products.insert_one(new_product)
+    with trace_span("mongo.products.find_one"):
+        created_product = await db.db.products.find_one({"_id": result.inserted_id})
     
     logger.info("msg", text="Product created successfully", id=str(result.inserted_id))
     return created_product
@@ -140,10 +145,11 @@ async def update_product(
 
     # Validation: If updating name, check if it conflicts with another product
     if "name" in data:
-        existing_name = await db.db.products.find_one({
-            "name": data["name"], 
-            "_id": {"$ne": ObjectId(id)} # Ensure it's not the same product
-        })
+        with trace_span("mongo.products.find_one"):
+            existing_name = await db.db.products.find_one({
+                "name": data["name"], 
+                "_id": {"$ne": ObjectId(id)} # Ensure it's not the same product
+            })
         if existing_name:
             raise HTTPException(
                 status_code=409, 
@@ -152,11 +158,12 @@ async def update_product(
     
     data["updated_at"] = datetime.utcnow()
     
-    result = await db.db.products.find_one_and_update(
-        {"_id": ObjectId(id)},
-        {"$set": data},
-        return_document=True
-    )
+    with trace_span("mongo.products.find_one_and_update"):
+        result = await db.db.products.find_one_and_update(
+            {"_id": ObjectId(id)},
+            {"$set": data},
+            return_document=True
+        )
     
     if not result:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -190,7 +197,8 @@ async def delete_product(
         raise HTTPException(status_code=400, detail="Invalid product ID")
 
     # Attempt to delete
-    result = await db.db.products.delete_one({"_id": ObjectId(id)})
+    with trace_span("mongo.products.delete_one"):
+        result = await db.db.products.delete_one({"_id": ObjectId(id)})
 
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -227,7 +235,8 @@ async def adjust_stock(
 
     # Consistency check to prevent negative stock
     if adjustment.adjustment < 0:
-        product = await db.db.products.find_one({"_id": ObjectId(id)})
+        with trace_span("mongo.products.find_one"):
+            product = await db.db.products.find_one({"_id": ObjectId(id)})
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
         
@@ -238,14 +247,15 @@ async def adjust_stock(
                 detail=f"Insufficient stock. Current: {current_stock}, Adjustment: {adjustment.adjustment}"
             )
 
-    result = await db.db.products.find_one_and_update(
-        {"_id": ObjectId(id)},
-        {
-            "$inc": {"stock_level": adjustment.adjustment},
-            "$set": {"updated_at": datetime.utcnow()}
-        },
-        return_document=True
-    )
+    with trace_span("mongo.products.find_one_and_update"):
+        result = await db.db.products.find_one_and_update(
+            {"_id": ObjectId(id)},
+            {
+                "$inc": {"stock_level": adjustment.adjustment},
+                "$set": {"updated_at": datetime.utcnow()}
+            },
+            return_document=True
+        )
 
     if not result:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -285,7 +295,8 @@ async def register_sale(sale: SaleCreate):
         if not ObjectId.is_valid(item.product_id):
              raise HTTPException(status_code=400, detail=f"Invalid product ID: {item.product_id}")
              
-        product = await db.db.products.find_one({"_id": ObjectId(item.product_id)})
+        with trace_span("mongo.products.find_one"):
+            product = await db.db.products.find_one({"_id": ObjectId(item.product_id)})
         if not product:
             raise HTTPException(status_code=404, detail=f"Product {item.product_id} not found")
         
@@ -297,17 +308,20 @@ async def register_sale(sale: SaleCreate):
 
     # 2. Deduct Stock
     for item in sale.items:
-        await db.db.products.update_one(
-            {"_id": ObjectId(item.product_id)},
-            {"$inc": {"stock_level": -item.quantity}}
-        )
+        with trace_span("mongo.products.update_one"):
+            await db.db.products.update_one(
+                {"_id": ObjectId(item.product_id)},
+                {"$inc": {"stock_level": -item.quantity}}
+            )
 
     # 3. Register Sale
     new_sale = sale.model_dump()
     new_sale["sale_date"] = datetime.utcnow()
     
-    result = await db.db.sales.insert_one(new_sale)
-    created_sale = await db.db.sales.find_one({"_id": result.inserted_id})
+    with trace_span("mongo.sales.insert_one"):
+        result = await db.db.sales.insert_one(new_sale)
+    with trace_span("mongo.sales.find_one"):
+        created_sale = await db.db.sales.find_one({"_id": result.inserted_id})
     
     logger.info("msg", text="Sale registered", id=str(result.inserted_id), total=sale.total_amount)
     return created_sale
@@ -346,5 +360,6 @@ async def get_sales_history(
         query["user_id"] = user_id
 
     logger.info("msg", text="Sales report requested by admin", admin_id=admin_id)
-    sales = await db.db.sales.find(query).to_list(1000)
+    with trace_span("mongo.sales.find"):
+        sales = await db.db.sales.find(query).to_list(1000)
     return sales
\ No newline at end of file
@@ -1,8 +1,10 @@
+import json
 import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import MagicMock, AsyncMock, patch
 from app.main import app
 from app.auth import verify_admin
+from app.tracing import SpanExporter, exporter
 
 # 1. Configurar o TestClient (Cliente síncrono para facilitar, o FastAPI trata do async internamente)
 client = TestClient(app)
@@ -102,4 +104,147 @@ class TestProducts:
         response = client.patch(f"/products/{product_id}/stock", json=payload)
 
         assert response.status_code == 400
-        assert "Insufficient stock" in response.json()["detail"]
\ No newline at end of file
+        assert "Insufficient stock" in response.json()["detail"]
+
+class TestTracing:
+
+    # Teste: Header Server-Timing com os spans do Mongo e request id propagado
+    @patch("app.routes.db")
+    def test_sale_server_timing(self, mock_db):
+        product_id = "507f1f77bcf86cd799439011"
+        payload = {
+            "user_id": "user_1",
+            "items": [
+                {"product_id": product_id, "quantity": 1},
+                {"product_id": product_id, "quantity": 1}
+            ],
+            "total_amount": 4.0
+        }
+
+        mock_db.db.products.find_one = AsyncMock(return_value={
+            "_id": product_id, "name": "Pipocas", "stock_level": 10
+        })
+        mock_db.db.products.update_one = AsyncMock()
+        mock_insert_result = MagicMock()
+        mock_insert_result.inserted_id = "507f1f77bcf86cd799439012"
+        mock_db.db.sales.insert_one = AsyncMock(return_value=mock_insert_result)
+        mock_db.db.sales.find_one = AsyncMock(return_value={
+            **payload, "_id": "507f1f77bcf86cd799439012", "sale_date": "2023-01-01"
+        })
+
+        trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+        response = client.post(
+            "/sales",
+            json=payload,
+            headers={
+                "X-Request-ID": "req-123",
+                "traceparent": f"00-{trace_id}-00f067aa0ba902b7-01"
+            }
+        )
+
+        assert response.status_code == 201
+        assert response.headers["X-Request-ID"] == "req-123"
+        assert response.headers["traceparent"].startswith(f"00-{trace_id}-")
+        assert response.headers["traceparent"].endswith("-01")
+        timing = response.headers["Server-Timing"]
+        assert 'mongo_products_find_one;dur=' in timing
+        assert 'desc="x2"' in timing
+        assert "mongo_sales_insert_one" in timing
+        assert "log;dur=" in timing
+        assert "total;dur=" in timing
+
+    # Teste: Ids inválidos vindos do cliente são substituídos
+    @patch("app.routes.db")
+    def test_invalid_trace_headers_replaced(self, mock_db):
+        mock_cursor = AsyncMock()
+        mock_cursor.to_list.return_value = []
+        mock_db.db.products.find.return_value = mock_cursor
+
+        response = client.get(
+            "/",
+            headers={
+                "X-Request-ID": "bad id\nwith spaces",
+                "traceparent": f"00-{'0' * 32}-00f067aa0ba902b7-00"
+            }
+        )
+
+        assert response.status_code == 200
+        assert response.headers["X-Request-ID"] != "bad id\nwith spaces"
+        assert not response.headers["traceparent"].startswith(f"00-{'0' * 32}-")
+
+    # Teste: As trace-flags recebidas (não amostrado) são mantidas
+    @patch("app.routes.db")
+    def test_traceparent_flags_kept(self, mock_db):
+        mock_cursor = AsyncMock()
+        mock_cursor.to_list.return_value = []
+        mock_db.db.products.find.return_value = mock_cursor
+
+        trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+        response = client.get("/", headers={"traceparent": f"00-{trace_id}-00f067aa0ba902b7-00"})
+
+        assert response.headers["traceparent"].startswith(f"00-{trace_id}-")
+        assert response.headers["traceparent"].endswith("-00")
+
+
+class TestTraceExport:
+
+    @staticmethod
+    def read_spans(path):
+        spans = []
+        for line in path.read_text().splitlines():
+            payload = json.loads(line)
+            resource = payload["resourceSpans"][0]
+            assert resource["resource"]["attributes"][0]["value"]["stringValue"] == "products-service"
+            spans.extend(resource["scopeSpans"][0]["spans"])
+        return spans
+
+    # Teste: Os spans de um pedido são escritos em OTLP JSON no TRACE_EXPORT_FILE
+    @patch("app.routes.db")
+    def test_export_to_file(self, mock_db, tmp_path, monkeypatch):
+        trace_file = tmp_path / "traces.jsonl"
+        monkeypatch.setenv("TRACE_EXPORT_FILE", str(trace_file))
+
+        mock_cursor = AsyncMock()
+        mock_cursor.to_list.return_value = []
+        mock_db.db.products.find.return_value = mock_cursor
+
+        response = client.get("/")
+        exporter.shutdown()
+
+        assert response.status_code == 200
+        spans = self.read_spans(trace_file)
+        root = next(span for span in spans if span["name"] == "GET /")
+        mongo = next(span for span in spans if span["name"] == "mongo.products.find")
+        assert mongo["parentSpanId"] == root["spanId"]
+        assert mongo["traceId"] == root["traceId"]
+        assert "status" not in root
+
+    # Teste: Um erro no Mongo continua a exportar o trace, com estado de erro
+    @patch("app.routes.db")
+    def test_export_on_error(self, mock_db, tmp_path, monkeypatch):
+        trace_file = tmp_path / "traces.jsonl"
+        monkeypatch.setenv("TRACE_EXPORT_FILE", str(trace_file))
+
+        mock_cursor = AsyncMock()
+        mock_cursor.to_list.side_effect = RuntimeError("Mongo down")
+        mock_db.db.products.find.return_value = mock_cursor
+
+        with pytest.raises(RuntimeError):
+            client.get("/")
+        exporter.shutdown()
+
+        spans = self.read_spans(trace_file)
+        root = next(span for span in spans if span["name"] == "GET /")
+        mongo = next(span for span in spans if span["name"] == "mongo.products.find")
+        assert root["status"]["code"] == 2
+        assert mongo["status"] == {"code": 2, "message": "RuntimeError"}
+
+    # Teste: Com a fila cheia os spans são descartados e contados
+    def test_queue_full_drops_spans(self):
+        with patch.object(SpanExporter, "_ensure_worker"):
+            span_exporter = SpanExporter(maxsize=1)
+            span_exporter.submit([])
+            span_exporter.submit([])
+            span_exporter.submit([])
+
+        assert span_exporter.dropped == 2
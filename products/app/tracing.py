@@ -0,0 +1,364 @@
+import os
+import re
+import json
+import time
+import uuid
+import queue
+import asyncio
+import functools
+import threading
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+import structlog
+from fastapi import Request
+
+# Não importa app.logger: o logger usa trace_span para medir os logs
+logger = structlog.get_logger()
+
+SERVICE_NAME = "products-service"
+
+# Exportação: fila limitada, esvaziada por uma única thread em lotes
+EXPORT_QUEUE_SIZE = 1000
+EXPORT_BATCH_SIZE = 100
+EXPORT_INTERVAL = 1.0
+
+# Lista mutável partilhada pelo pedido atual. Dependências síncronas correm
+# numa threadpool com uma cópia do contexto, mas a lista é o mesmo objeto,
+# por isso os spans registados lá continuam a chegar ao middleware.
+_current_spans: ContextVar[Optional[list]] = ContextVar("current_spans", default=None)
+
+# Span ativo no contexto atual, usado como pai dos spans aninhados
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+# W3C Trace Context: version-traceid-parentid-flags
+TRACEPARENT_RE = re.compile(r"00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})")
+INVALID_TRACE_ID = "0" * 32
+INVALID_PARENT_ID = "0" * 16
+
+# Request ids aceites do cliente/gateway; outros são substituídos
+REQUEST_ID_RE = re.compile(r"[A-Za-z0-9._-]{1,128}")
+
+
+class Span:
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], **attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = attributes
+        # time_ns() só para os timestamps OTLP; durações usam o relógio monotónico
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._start_perf = time.perf_counter_ns()
+        self._end_perf = None
+        self.error = None
+
+    def finish(self):
+        self.end_ns = time.time_ns()
+        self._end_perf = time.perf_counter_ns()
+
+    @property
+    def duration_ms(self) -> float:
+        end = self._end_perf if self._end_perf is not None else time.perf_counter_ns()
+        return (end - self._start_perf) / 1_000_000
+
+    def to_otlp(self) -> dict:
+        """Converte o span para o formato JSON do OTLP/HTTP."""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": [
+                {"key": k, "value": {"stringValue": str(v)}}
+                for k, v in self.attributes.items()
+            ],
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.error:
+            span["status"] = {"code": 2, "message": self.error}
+        return span
+
+
+@contextmanager
+def trace_span(name: str, **attributes):
+    """
+    Mede um bloco de código dentro do pedido atual.
+    Funciona em código síncrono e assíncrono (`with trace_span(...)`).
+    Fora de um pedido (ex.: arranque) não faz nada.
+    """
+    spans = _current_spans.get()
+    if spans is None:
+        yield None
+        return
+
+    parent = _current_span.get() or spans[0]
+    span = Span(name, parent.trace_id, parent.span_id, **attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except Exception as e:
+        span.error = type(e).__name__
+        raise
+    finally:
+        span.finish()
+        _current_span.reset(token)
+        spans.append(span)
+
+
+def traced(name: str):
+    """Decorator que mede uma função (ex.: uma dependência) com trace_span."""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with trace_span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with trace_span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def parse_traceparent(header: Optional[str]):
+    """Devolve (trace_id, parent_id, flags) de um header `traceparent` válido."""
+    if not header:
+        return None, None, None
+    match = TRACEPARENT_RE.fullmatch(header.strip().lower())
+    if not match:
+        return None, None, None
+    trace_id, parent_id, flags = match.groups()
+    if trace_id == INVALID_TRACE_ID or parent_id == INVALID_PARENT_ID:
+        return None, None, None
+    return trace_id, parent_id, flags
+
+
+def parse_request_id(header: Optional[str]) -> str:
+    """Aceita o `X-Request-ID` recebido só se for curto e seguro; senão gera um."""
+    if header and REQUEST_ID_RE.fullmatch(header):
+        return header
+    return uuid.uuid4().hex
+
+
+def server_timing_header(spans: List[Span]) -> str:
+    """
+    Resume os spans no formato `Server-Timing`.
+    Spans com o mesmo nome (ex.: find_one dentro de um loop) são agregados.
+    Só entram os filhos diretos do pedido, para não contar o mesmo tempo duas vezes.
+    """
+    root = spans[0]
+    totals = {}
+    for span in spans[1:]:
+        if span.parent_id != root.span_id:
+            continue
+        key = re.sub(r"[^A-Za-z0-9_\-]", "_", span.name)
+        duration, count = totals.get(key, (0.0, 0))
+        totals[key] = (duration + span.duration_ms, count + 1)
+
+    entries = [
+        f'{key};dur={duration:.2f};desc="x{count}"'
+        for key, (duration, count) in totals.items()
+    ]
+    entries.append(f"total;dur={spans[0].duration_ms:.2f}")
+    return ", ".join(entries)
+
+
+# --- EXPORTAÇÃO ---
+
+def _otlp_payload(spans: List[Span]) -> dict:
+    return {
+        "resourceSpans": [{
+            "resource": {
+                "attributes": [
+                    {"key": "service.name", "value": {"stringValue": SERVICE_NAME}}
+                ]
+            },
+            "scopeSpans": [{
+                "scope": {"name": "app.tracing"},
+                "spans": [span.to_otlp() for span in spans],
+            }],
+        }]
+    }
+
+
+def _write_file(path: str, payload: dict):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(payload) + "\n")
+
+
+def _post_otlp(endpoint: str, payload: dict):
+    req = urllib.request.Request(
+        endpoint.rstrip("/") + "/v1/traces",
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(req, timeout=2):
+        pass
+
+
+def _export_enabled() -> bool:
+    return bool(os.getenv("TRACE_EXPORT_FILE") or os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"))
+
+
+def _export_batch(spans: List[Span]):
+    file_path = os.getenv("TRACE_EXPORT_FILE")
+    endpoint = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+
+    payload = _otlp_payload(spans)
+    try:
+        if file_path:
+            _write_file(file_path, payload)
+        if endpoint:
+            _post_otlp(endpoint, payload)
+    except Exception as e:
+        logger.warn("msg", text="Trace export failed", error=str(e))
+
+
+_STOP = object()
+
+
+class SpanExporter:
+    """
+    Junta os spans dos pedidos numa fila limitada e exporta-os em lotes
+    a partir de uma única thread. Se a fila encher (coletor lento ou em baixo),
+    os spans novos são descartados em vez de acumular memória.
+    Como só esta thread escreve no ficheiro, as linhas nunca se misturam.
+    """
+
+    def __init__(self, maxsize: int = EXPORT_QUEUE_SIZE):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.dropped = 0
+
+    def submit(self, spans: List[Span]):
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def _ensure_worker(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="span-exporter", daemon=True
+                )
+                self._thread.start()
+
+    def shutdown(self, timeout: float = 5.0):
+        """Exporta o que ainda está na fila e termina a thread (ex.: no shutdown da app)."""
+        with self._lock:
+            thread = self._thread
+        if thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warn("msg", text="Trace exporter did not stop: queue full")
+            return
+        thread.join(timeout)
+        with self._lock:
+            self._thread = None
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = list(item)
+            deadline = time.monotonic() + EXPORT_INTERVAL
+            while len(batch) < EXPORT_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.extend(item)
+
+            with self._lock:
+                dropped, self.dropped = self.dropped, 0
+            if dropped:
+                logger.warn("msg", text="Trace export queue full, spans dropped", requests=dropped)
+
+            _export_batch(batch)
+
+
+exporter = SpanExporter()
+
+
+def export_spans(spans: List[Span]):
+    """Entrega os spans à thread de exportação sem bloquear a resposta."""
+    if not _export_enabled():
+        return
+    exporter.submit(spans)
+
+
+# --- MIDDLEWARE ---
+
+async def tracing_middleware(request: Request, call_next):
+    """
+    Associa um request id e um trace a cada pedido.
+    Reaproveita `X-Request-ID` e `traceparent` vindos do api-gateway.
+    """
+    request_id = parse_request_id(request.headers.get("x-request-id"))
+    trace_id, parent_id, flags = parse_traceparent(request.headers.get("traceparent"))
+    if trace_id is None:
+        trace_id = uuid.uuid4().hex
+        flags = "01"
+
+    # O nome final usa o template da rota (ver abaixo) para não ter um nome por ID
+    root = Span(
+        request.method,
+        trace_id,
+        parent_id,
+        request_id=request_id,
+    )
+    root.attributes["http.target"] = request.url.path
+    spans = [root]
+    spans_token = _current_spans.set(spans)
+    span_token = _current_span.set(root)
+
+    structlog.contextvars.clear_contextvars()
+    structlog.contextvars.bind_contextvars(request_id=request_id, trace_id=trace_id)
+
+    try:
+        response = await call_next(request)
+        root.attributes["http.status_code"] = response.status_code
+    except Exception as e:
+        root.error = type(e).__name__
+        raise
+    finally:
+        root.finish()
+        route = request.scope.get("route")
+        if route is not None:
+            root.name = f"{request.method} {route.path}"
+        _current_span.reset(span_token)
+        _current_spans.reset(spans_token)
+        structlog.contextvars.clear_contextvars()
+        # Exporta também quando o handler falha: são esses os pedidos a investigar
+        export_spans(spans)
+
+    response.headers["X-Request-ID"] = request_id
+    response.headers["traceparent"] = f"00-{trace_id}-{root.span_id}-{flags}"
+    response.headers["Server-Timing"] = server_timing_header(spans)
+    return response